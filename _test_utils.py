@@ -0,0 +1,267 @@
+"""
+Shared helpers for the JSON watcher/regeneration test scripts.
+Locates the detection JSON files and edits them in ways the file watcher
+can observe (atomic rewrites, in-place bbox patches).
+"""
+
+import os
+import re
+import json
+import mmap
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from itertools import islice
+from pathlib import Path
+
+JSON_DIR = Path(__file__).parent / "output_image" / "json"
+LABELED_DIR = Path(__file__).parent / "output_image" / "labeled"
+
+# Detection files are "<image>_detections.json";
+# name[SUFFIX_START:] == DETECTION_SUFFIX is a cheaper endswith() for directory scans
+DETECTION_SUFFIX = '_detections.json'
+SUFFIX_START = -len(DETECTION_SUFFIX)
+
+# Prefer orjson for detection JSON load/dump, fall back to the standard library
+try:
+    import orjson
+    _loads = orjson.loads
+    def _dumps(obj):
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+except ImportError:
+    _loads = json.loads
+    def _dumps(obj):
+        return json.dumps(obj, indent=2).encode('utf-8')
+
+# ijson lets us stream a single bbox out of large detection files
+try:
+    import ijson
+    IJSON_AVAILABLE = True
+except ImportError:
+    IJSON_AVAILABLE = False
+
+# flock is POSIX-only; on Windows the helpers below run without locking
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+@contextmanager
+def locked_open(path, mode, shared=False):
+    """
+    Open a file and hold an flock on it while the block runs.
+    
+    The watcher's regenerator takes a shared lock when it reads a detection
+    JSON, so in-place edits made under the exclusive lock are never read
+    half-applied.
+    
+    Args:
+        path (str): File to open
+        mode (str): Mode passed to open()
+        shared (bool): Take a shared (read) lock instead of an exclusive one
+    """
+    f = open(path, mode)
+    try:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        yield f
+    finally:
+        if fcntl is not None:
+            # Push buffered writes to the file before a shared-lock reader can get in
+            if f.writable():
+                f.flush()
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        f.close()
+
+def read_first_bbox(path):
+    """
+    Read the bbox of the first detection without building the whole document.
+    
+    Args:
+        path (str): Path to the detection JSON file
+    
+    Returns:
+        tuple: (x, y, width, height) of the first detection, or None if there are none
+    """
+    with locked_open(path, 'rb', shared=True) as f:
+        if IJSON_AVAILABLE:
+            bbox = next(ijson.items(f, 'detections.item.bbox', use_float=False), None)
+        else:
+            detections = _loads(f.read()).get('detections', [])
+            bbox = detections[0]['bbox'] if detections else None
+    
+    if bbox is None:
+        return None
+    return bbox['x'], bbox['y'], bbox['width'], bbox['height']
+
+def atomic_write_bytes(path, buf, dir_fd=None, durable=True):
+    """
+    Write bytes to path via a temp file and os.replace().
+    
+    Readers (such as the file watcher) never see a half-written file: they get
+    either the old contents or the new ones.
+    
+    Args:
+        path (str): Destination file (a bare file name when dir_fd is given)
+        buf (bytes): New file contents
+        dir_fd (int, optional): Open fd of the destination's directory. Lets
+                                repeated saves skip resolving the directory path.
+        durable (bool): fsync the temp file before the rename. Readers see the
+                        new contents either way; skip it for throwaway edits.
+    """
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    # Raw fd instead of a buffered file object: one write() for the whole payload
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_CLOEXEC', 0), 0o666, dir_fd=dir_fd)
+    try:
+        view = memoryview(buf)
+        while view:
+            view = view[os.write(fd, view):]
+        if durable:
+            os.fsync(fd)
+    finally:
+        os.close(fd)
+    os.replace(tmp_path, path, src_dir_fd=dir_fd, dst_dir_fd=dir_fd)
+
+def atomic_write_json(path, obj, dir_fd=None, durable=True):
+    """Serialize obj and atomically replace the JSON file at path (see atomic_write_bytes)."""
+    atomic_write_bytes(path, _dumps(obj), dir_fd=dir_fd, durable=durable)
+
+# Matches the integer x/y pair inside a "bbox" object
+_BBOX_XY_RE = re.compile(rb'"bbox"\s*:\s*\{[^}]*?"x"\s*:\s*(-?\d+)\s*,\s*"y"\s*:\s*(-?\d+)')
+
+def patch_bbox_xy(path, det_index, new_x, new_y):
+    """
+    Overwrite the x/y of one detection's bbox in place without re-serializing the file.
+    
+    The new digits are right-aligned into the old ones (padded with spaces), so the
+    file length never changes. If a value does not fit, the whole document is
+    rewritten instead.
+    
+    Args:
+        path (str): Path to the detection JSON file
+        det_index (int): Index of the detection to patch
+        new_x (int): New bbox x coordinate
+        new_y (int): New bbox y coordinate
+    
+    Returns:
+        bool: True if the file was patched in place, False if it was rewritten
+    """
+    with locked_open(path, 'r+b') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            match = next(islice(_BBOX_XY_RE.finditer(mm), det_index, None), None)
+            spans = (match.span(1), match.span(2)) if match is not None else None
+            del match
+        
+        if spans is not None:
+            (x_start, x_end), (y_start, y_end) = spans
+            x_bytes = str(new_x).encode()
+            y_bytes = str(new_y).encode()
+            if len(x_bytes) <= x_end - x_start and len(y_bytes) <= y_end - y_start:
+                # Plain writes rather than mmap stores: inotify does not report
+                # changes made through a memory map, so the watcher would miss them
+                f.seek(x_start)
+                f.write(x_bytes.rjust(x_end - x_start))
+                f.seek(y_start)
+                f.write(y_bytes.rjust(y_end - y_start))
+                return True
+    
+    # Fall back to a full rewrite when the new value is wider than the old one
+    with locked_open(path, 'rb', shared=True) as f:
+        data = _loads(f.read())
+    bbox = data['detections'][det_index]['bbox']
+    bbox['x'] = new_x
+    bbox['y'] = new_y
+    atomic_write_json(path, data)
+    return False
+
+def count_detections(path):
+    """
+    Count the detections in a JSON file without decoding it.
+    
+    Every detection carries exactly one "bbox" key, so a byte-level count of
+    that key gives the number of detections.
+    """
+    with locked_open(path, 'rb', shared=True) as f:
+        return f.read().count(b'"bbox"')
+
+def wait_for_mtime_change(path, prev_mtime_ns, timeout=1.0, tick=0.01):
+    """
+    Poll a file until its mtime differs from prev_mtime_ns.
+    
+    Args:
+        path (str): File to watch (it may not exist yet)
+        prev_mtime_ns (int): mtime in nanoseconds before the change, or 0 if missing
+        timeout (float): Maximum number of seconds to wait
+        tick (float): Poll interval in seconds
+    
+    Returns:
+        bool: True if the mtime changed before the timeout
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            if os.stat(path).st_mtime_ns != prev_mtime_ns:
+                return True
+        except FileNotFoundError:
+            pass
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(tick)
+
+@lru_cache(maxsize=4)
+def first_detection_json(json_dir, load=True):
+    """
+    List the detection JSON files in json_dir and parse the first one.
+    
+    The result is cached so the tests share one directory scan and parse.
+    Call first_detection_json.cache_clear() after writing to the file.
+    
+    Args:
+        json_dir (Path): Directory holding *_detections.json files
+        load (bool): Whether to parse the first file. If False, data is None.
+    
+    Returns:
+        tuple: (json_files, json_path, data). json_files holds the sorted file
+               names; json_path and data are None when there are no detection files.
+    """
+    json_paths = sorted(json_dir.glob('*_detections.json'))
+    json_files = tuple(p.name for p in json_paths)
+    
+    if not json_files:
+        return json_files, None, None
+    
+    json_path = json_paths[0]
+    if not load:
+        return json_files, json_path, None
+    with locked_open(json_path, 'rb', shared=True) as f:
+        data = _loads(f.read())
+    return json_files, json_path, data
+
+def first_json_path():
+    """Return the path of the first detection JSON file, or None if there is none."""
+    return first_detection_json(JSON_DIR, load=False)[1]
+
+def modify_first_bbox(path, dx, dy):
+    """
+    Move the first detection's bbox by (dx, dy) in place.
+    
+    Args:
+        path (str): Path to the detection JSON file
+        dx (int): Pixels to move right
+        dy (int): Pixels to move down
+    
+    Returns:
+        tuple: Original (x, y) of the bbox, or None if the file has no detections
+    """
+    first_bbox = read_first_bbox(path)
+    if first_bbox is None:
+        return None
+    x, y = first_bbox[0], first_bbox[1]
+    patch_bbox_xy(path, 0, x + dx, y + dy)
+    first_detection_json.cache_clear()
+    return x, y
+
+def restore_bbox(path, det_index, x, y):
+    """Put a detection's bbox back at (x, y), e.g. after modify_first_bbox()."""
+    patch_bbox_xy(path, det_index, x, y)
+    first_detection_json.cache_clear()
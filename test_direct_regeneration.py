@@ -4,45 +4,185 @@ This bypasses the file watcher and directly tests image regeneration.
 """
 
 import os
-import json
+import sys
 import time
-from test_local_inference import regenerate_image_from_json, list_test_images
+import hashlib
+import threading
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from test_local_inference import regenerate_image_from_json, list_test_images, NUMBA_AVAILABLE, WATCHDOG_AVAILABLE
+from _test_utils import (
+    JSON_DIR, atomic_write_bytes, atomic_write_json, first_detection_json,
+    first_json_path, locked_open,
+)
+
+# Prefer watchfiles for the manual edit test, fall back to watchdog, then to Enter
+try:
+    from watchfiles import watch
+    WATCHFILES_AVAILABLE = True
+except ImportError:
+    WATCHFILES_AVAILABLE = False
+
+if WATCHDOG_AVAILABLE:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+
+def _file_digest(path):
+    """Return a short content hash of a file."""
+    with open(path, 'rb') as f:
+        return hashlib.blake2b(f.read(), digest_size=16).digest()
+
+def _fadvise(path, advice):
+    """
+    Pass a page-cache hint for a whole file to the kernel.
+    
+    Args:
+        path (str): File the hint applies to
+        advice (str): Name of an os.POSIX_FADV_* constant
+    """
+    if not hasattr(os, 'posix_fadvise'):
+        return
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.posix_fadvise(fd, 0, 0, getattr(os, advice))
+    finally:
+        os.close(fd)
+
+def _wait_for_json_save(json_path, debounce=0.2):
+    """
+    Block until json_path is saved.
+    
+    Uses watchfiles or watchdog to wake on the save itself. Without either one,
+    it falls back to asking the user to press Enter.
+    
+    Args:
+        json_path (Path): JSON file to wait for
+        debounce (float): Seconds to let multi-step editor saves settle
+    """
+    if WATCHFILES_AVAILABLE:
+        # Watch the directory, not the file, so atomic rename-on-save is seen too
+        for changes in watch(JSON_DIR, debounce=int(debounce * 1000)):
+            if any(Path(changed_path) == json_path for _, changed_path in changes):
+                return
+    
+    elif WATCHDOG_AVAILABLE:
+        saved = threading.Event()
+        
+        class SaveHandler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                # Only writes count: newer watchdog also reports "opened" and
+                # "closed_no_write" when the file is merely read
+                if event.is_directory or event.event_type not in ("modified", "created", "moved", "closed"):
+                    return
+                target = event.dest_path if event.event_type == "moved" else event.src_path
+                if Path(target) == json_path:
+                    saved.set()
+        
+        observer = Observer()
+        observer.schedule(SaveHandler(), str(JSON_DIR), recursive=False)
+        observer.start()
+        try:
+            saved.wait()
+            time.sleep(debounce)
+        finally:
+            observer.stop()
+            observer.join()
+    
+    else:
+        input("\nPress Enter when you've saved the JSON file...")
+
+def _check_umat_drawing():
+    """
+    Draw the same boxes through the host and the OpenCL (UMat) paths and compare.
+    
+    A CPU-backed UMat runs the same cv2 calls as the >4 MP OpenCL path, so this
+    catches drawing calls that UMat rejects even on machines without OpenCL.
+    
+    Returns:
+        bool: True if both paths produce identical pixels
+    """
+    import cv2
+    import numpy as np
+    from test_local_inference import _draw_detections, _draw_detections_umat
+    
+    boxes = np.array([[10, 40, 80, 60], [60, 5, 120, 90], [-5, 120, 50, 40]], dtype=np.int32)
+    labels = ["hotspot (0.91)", "hotspot (0.42)", "edge (0.10)"]
+    
+    host = np.zeros((180, 200, 3), dtype=np.uint8)
+    _draw_detections(host, boxes, labels)
+    
+    umat = cv2.UMat(np.zeros((180, 200, 3), dtype=np.uint8))
+    _draw_detections_umat(umat, boxes, labels)
+    return np.array_equal(host, umat.get())
+
+def _check_outline_kernel(trials=200):
+    """
+    Compare the Numba outline kernel with cv2.polylines on random boxes.
+    
+    Boxes may be empty, flipped or partly outside the image, so the clipping
+    and the degenerate cases are covered too.
+    
+    Args:
+        trials (int): Number of random images to compare
+    
+    Returns:
+        bool: True if the kernel drew the same pixels as cv2 in every trial
+    """
+    import cv2
+    import numpy as np
+    from test_local_inference import BOX_COLOR, _box_corners, _box_outline_kernel
+    
+    kernel = _box_outline_kernel()
+    color = np.asarray(BOX_COLOR, dtype=np.uint8)
+    rng = np.random.default_rng(0)
+    for _ in range(trials):
+        height, width = rng.integers(1, 200, size=2)
+        n = rng.integers(1, 8)
+        boxes = np.column_stack([rng.integers(-20, width + 5, n), rng.integers(-20, height + 5, n),
+                                 rng.integers(-3, 120, n), rng.integers(-3, 120, n)]).astype(np.int32)
+        expected = np.zeros((height, width, 3), dtype=np.uint8)
+        cv2.polylines(expected, _box_corners(boxes), True, BOX_COLOR, 2)
+        actual = np.zeros((height, width, 3), dtype=np.uint8)
+        kernel(actual, boxes, color)
+        if not np.array_equal(expected, actual):
+            return False
+    return True
 
 def test_direct_regeneration():
     """Test regenerating images directly from JSON files."""
     
-    json_dir = os.path.join(os.path.dirname(__file__), "output_image", "json")
-    
-    if not os.path.exists(json_dir):
+    if not JSON_DIR.exists():
         print("❌ No JSON directory found. Process some images first.")
         return
     
-    # List JSON files
-    json_files = [f for f in os.listdir(json_dir) if f.endswith('_detections.json')]
+    # List JSON files and load the first one (shared with test_json_watcher)
+    json_files, json_path, original_data = first_detection_json(JSON_DIR)
     
     if not json_files:
         print("❌ No detection JSON files found. Process some images first.")
         return
     
-    print(f"✅ Found {len(json_files)} JSON file(s):")
-    for i, file in enumerate(json_files, 1):
-        print(f"  {i}. {file}")
+    print(f"✅ Found {len(json_files)} JSON file(s):",
+          *(f"  {i}. {file}" for i, file in enumerate(json_files, 1)), sep="\n")
     
     # Test with first JSON file
-    json_path = os.path.join(json_dir, json_files[0])
     print(f"\n🧪 Testing direct regeneration with: {json_files[0]}")
     
     try:
-        # Load original JSON
-        with open(json_path, 'r') as f:
-            original_data = json.load(f)
-        
         print(f"   Original detections: {len(original_data.get('detections', []))}")
         
-        # Test 1: Regenerate without changes
+        # Start reading the source image into the page cache before Test 1 decodes it
+        _fadvise(original_data['image_path'], 'POSIX_FADV_WILLNEED')
+        
+        # Test 1: Regenerate without changes (the parsed JSON is handed straight to the regenerator)
         print(f"\n📋 Test 1: Regenerate image without changes")
-        output_path = regenerate_image_from_json(json_path)
+        output_path = regenerate_image_from_json(json_path, json_data=original_data)
         print(f"   ✅ Successfully regenerated: {os.path.basename(output_path)}")
+        baseline_digest = _file_digest(output_path)
         
         # Test 2: Modify JSON and regenerate
         if len(original_data.get('detections', [])) > 0:
@@ -52,76 +192,110 @@ def test_direct_regeneration():
             original_x = original_data['detections'][0]['bbox']['x']
             original_y = original_data['detections'][0]['bbox']['y']
             
-            # Modify coordinates
-            original_data['detections'][0]['bbox']['x'] = original_x + 20
-            original_data['detections'][0]['bbox']['y'] = original_y + 15
-            
-            # Save modified JSON
-            with open(json_path, 'w') as f:
-                json.dump(original_data, f, indent=2)
+            # Snapshot the file so it can be restored byte-for-byte
+            with locked_open(json_path, 'rb', shared=True) as f:
+                original_bytes = f.read()
             
-            print(f"   Modified coordinates: ({original_x}, {original_y}) → ({original_x + 20}, {original_y + 15})")
+            try:
+                # Modify coordinates
+                original_data['detections'][0]['bbox']['x'] = original_x + 20
+                original_data['detections'][0]['bbox']['y'] = original_y + 15
+                
+                # Save modified JSON
+                atomic_write_json(json_path, original_data)
+                first_detection_json.cache_clear()
+                
+                print(f"   Modified coordinates: ({original_x}, {original_y}) → ({original_x + 20}, {original_y + 15})")
+                
+                # Regenerate image
+                output_path = regenerate_image_from_json(json_path, json_data=original_data)
+                print(f"   ✅ Successfully regenerated with changes: {os.path.basename(output_path)}")
+            finally:
+                # Restore original JSON. Regenerating it again would repeat Test 1, so unless
+                # FULL_TEST is set the labeled image is left showing the modified box.
+                original_data['detections'][0]['bbox']['x'] = original_x
+                original_data['detections'][0]['bbox']['y'] = original_y
+                atomic_write_bytes(json_path, original_bytes)
+                first_detection_json.cache_clear()
+                # Last write of the run; the fsynced pages need not stay cached
+                _fadvise(json_path, 'POSIX_FADV_DONTNEED')
+                print(f"   🔄 Restored original coordinates in JSON")
             
-            # Regenerate image
-            output_path = regenerate_image_from_json(json_path)
-            print(f"   ✅ Successfully regenerated with changes: {os.path.basename(output_path)}")
-            
-            # Wait a moment
-            time.sleep(2)
-            
-            # Restore original coordinates
-            original_data['detections'][0]['bbox']['x'] = original_x
-            original_data['detections'][0]['bbox']['y'] = original_y
-            
-            with open(json_path, 'w') as f:
-                json.dump(original_data, f, indent=2)
-            
-            # Regenerate again
-            output_path = regenerate_image_from_json(json_path)
-            print(f"   ✅ Successfully restored original coordinates and regenerated")
+            # Test 3 (FULL_TEST=1 only): the restored file must reproduce the Test 1 image
+            if os.environ.get('FULL_TEST'):
+                print(f"\n📋 Test 3: Regenerate from restored JSON")
+                output_path = regenerate_image_from_json(json_path)
+                if _file_digest(output_path) != baseline_digest:
+                    raise AssertionError("Image regenerated from restored JSON differs from Test 1")
+                print(f"   ✅ Restored image matches the Test 1 output")
+        
+        # Test 4: the OpenCL path used for large images must draw the same pixels
+        print(f"\n📋 Test 4: Draw through a UMat (OpenCL path)")
+        if not _check_umat_drawing():
+            raise AssertionError("UMat drawing differs from the host drawing")
+        print(f"   ✅ UMat drawing matches the host drawing")
         
-        print(f"\n🎉 All tests passed! The regeneration function works correctly.")
-        print(f"📁 Check the labeled image: {output_path}")
+        # Test 5: the Numba outline kernel must draw exactly what cv2.polylines draws
+        if NUMBA_AVAILABLE:
+            print(f"\n📋 Test 5: Numba outline kernel vs cv2.polylines")
+            if not _check_outline_kernel():
+                raise AssertionError("Numba outline kernel differs from cv2.polylines")
+            print(f"   ✅ Kernel outlines match cv2.polylines")
+        
+        # Batch mode (BATCH=1): regenerate every JSON file, one process per CPU.
+        # Processes rather than threads, since the drawing/encoding holds the GIL.
+        if len(json_files) > 1 and os.environ.get('BATCH'):
+            print(f"\n📋 Batch: Regenerate all {len(json_files)} JSON files in parallel")
+            json_paths = [str(JSON_DIR / name) for name in json_files]
+            with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+                for batch_output in executor.map(regenerate_image_from_json, json_paths):
+                    print(f"   ✅ Regenerated: {os.path.basename(batch_output)}")
+        
+        print(f"\n🎉 All tests passed! The regeneration function works correctly.",
+              f"📁 Check the labeled image: {output_path}", sep="\n")
         
     except Exception as e:
         print(f"❌ Error during test: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        traceback.print_exception(type(e), e, e.__traceback__, file=sys.stderr)
 
 def test_manual_json_edit():
     """Interactive test - asks user to manually edit JSON."""
     
-    json_dir = os.path.join(os.path.dirname(__file__), "output_image", "json")
-    json_files = [f for f in os.listdir(json_dir) if f.endswith('_detections.json')]
+    json_path = first_json_path()
     
-    if not json_files:
+    if json_path is None:
         print("❌ No JSON files found.")
         return
     
-    json_path = os.path.join(json_dir, json_files[0])
-    
-    print(f"🔧 Manual Edit Test")
-    print(f"📁 JSON file: {json_path}")
-    print(f"📝 Instructions:")
-    print(f"   1. Open the JSON file in any text editor")
-    print(f"   2. Change some bbox coordinates (x, y, width, height)")
-    print(f"   3. Save the file")
-    print(f"   4. Press Enter here to regenerate the image")
+    lines = [
+        f"🔧 Manual Edit Test",
+        f"📁 JSON file: {json_path}",
+        f"📝 Instructions:",
+        f"   1. Open the JSON file in any text editor",
+        f"   2. Change some bbox coordinates (x, y, width, height)",
+        f"   3. Save the file",
+    ]
+    if WATCHFILES_AVAILABLE or WATCHDOG_AVAILABLE:
+        lines.append(f"   4. The image is regenerated as soon as the save is detected")
+        lines.append(f"\n👀 Waiting for the JSON file to be saved...")
+    else:
+        lines.append(f"   4. Press Enter here to regenerate the image")
+    print(*lines, sep="\n", flush=True)
     
-    input("\nPress Enter when you've saved the JSON file...")
+    _wait_for_json_save(json_path)
     
     try:
         output_path = regenerate_image_from_json(json_path)
-        print(f"✅ Image regenerated: {output_path}")
-        print(f"👀 Check the labeled image to see your changes!")
+        print(f"✅ Image regenerated: {output_path}",
+              f"👀 Check the labeled image to see your changes!", sep="\n")
     except Exception as e:
         print(f"❌ Error: {str(e)}")
 
 if __name__ == "__main__":
-    print("=== Direct JSON Regeneration Test ===")
-    print("Choose a test:")
-    print("1. Automatic test (modifies JSON programmatically)")
-    print("2. Manual test (you edit JSON file)")
+    print("=== Direct JSON Regeneration Test ===",
+          "Choose a test:",
+          "1. Automatic test (modifies JSON programmatically)",
+          "2. Manual test (you edit JSON file)", sep="\n")
     
     choice = input("\nEnter choice (1 or 2): ").strip()
     
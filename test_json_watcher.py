@@ -4,66 +4,59 @@ Run this after processing some images to test JSON editing and auto-update.
 """
 
 import os
-import json
-import time
+from _test_utils import (
+    JSON_DIR, LABELED_DIR, first_detection_json, count_detections,
+    modify_first_bbox, restore_bbox, wait_for_mtime_change,
+)
 
 def test_json_editing():
     """Test the JSON editing and regeneration functionality."""
     
     # Check if we have JSON files
-    json_dir = os.path.join(os.path.dirname(__file__), "output_image", "json")
-    
-    if not os.path.exists(json_dir):
+    if not JSON_DIR.exists():
         print("❌ No JSON directory found. Run the main script to process images first.")
         return
     
-    # List JSON files
-    json_files = [f for f in os.listdir(json_dir) if f.endswith('_detections.json')]
+    # List JSON files; the test edits raw bytes, so the first file is not parsed
+    json_files, json_path, _ = first_detection_json(JSON_DIR, load=False)
     
     if not json_files:
         print("❌ No detection JSON files found. Process some images first.")
         return
     
-    print(f"✅ Found {len(json_files)} JSON file(s):")
-    for i, file in enumerate(json_files, 1):
-        print(f"  {i}. {file}")
+    print(f"✅ Found {len(json_files)} JSON file(s):",
+          *(f"  {i}. {file}" for i, file in enumerate(json_files, 1)), sep="\n")
     
     # Test JSON modification
-    json_path = os.path.join(json_dir, json_files[0])
     print(f"\n🧪 Testing JSON modification with: {json_files[0]}")
     
     try:
-        # Load and modify JSON
-        with open(json_path, 'r') as f:
-            data = json.load(f)
-        
-        original_count = len(data.get('detections', []))
+        original_count = count_detections(json_path)
         print(f"   Original detections: {original_count}")
         
         if original_count > 0:
-            # Modify the first detection's bbox
-            detection = data['detections'][0]
-            original_x = detection['bbox']['x']
-            detection['bbox']['x'] = original_x + 10  # Move box 10 pixels right
-            detection['bbox']['y'] = detection['bbox']['y'] + 5  # Move box 5 pixels down
-            
-            print(f"   Modified first detection: moved box to ({detection['bbox']['x']}, {detection['bbox']['y']})")
-            
-            # Save modified JSON
-            with open(json_path, 'w') as f:
-                json.dump(data, f, indent=2)
+            # The watcher rewrites the labeled image; remember its mtime to detect that
+            base_name = json_path.name[:-len('_detections.json')]
+            labeled_path = LABELED_DIR / f"{base_name}_boxed.png"
+            try:
+                labeled_mtime_ns = os.stat(labeled_path).st_mtime_ns
+            except FileNotFoundError:
+                labeled_mtime_ns = 0
             
-            print(f"✅ JSON file modified successfully!")
-            print(f"💡 If the file watcher is running, the image should update automatically.")
-            print(f"   Check the labeled image to see if the bounding box moved.")
+            # Modify the first detection's bbox: 10 pixels right, 5 pixels down
+            original_x, original_y = modify_first_bbox(json_path, 10, 5)
             
-            # Wait a moment, then restore original
-            time.sleep(3)
-            detection['bbox']['x'] = original_x
-            detection['bbox']['y'] = detection['bbox']['y'] - 5
+            print(f"   Modified first detection: moved box to ({original_x + 10}, {original_y + 5})",
+                  f"✅ JSON file modified successfully!",
+                  f"💡 If the file watcher is running, the image should update automatically.",
+                  f"   Check the labeled image to see if the bounding box moved.", sep="\n", flush=True)
             
-            with open(json_path, 'w') as f:
-                json.dump(data, f, indent=2)
+            # Wait for the watcher to regenerate the image, then restore original
+            if wait_for_mtime_change(labeled_path, labeled_mtime_ns, timeout=3.0):
+                print(f"🖼️  Labeled image updated: {labeled_path.name}")
+            else:
+                print(f"⚠️  Labeled image did not change within 3s. Is the file watcher running?")
+            restore_bbox(json_path, 0, original_x, original_y)
             
             print(f"🔄 Restored original coordinates.")
         else:
@@ -4,30 +4,101 @@ This script shows how to use the updated inference_core.py to process local test
 """
 
 import os
+import sys
 import json
 import time
-import cv2
-import numpy as np
 import atexit
+import ctypes
+import hashlib
+import importlib.util
+import mmap
+import select
 import signal
-from threading import Timer
-from inference_core import run_pipeline_for_image
+import struct
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from pathlib import Path
 
-# Global variable to track the file watcher
+# cv2, numpy and inference_core (torch) are imported inside the functions that use them,
+# so listing images, the watcher, and the test scripts importing this module start fast.
+
+# Global variables to track the file watcher and its debounce worker
 global_observer = None
+global_debouncer = None
+
+# On Linux the watcher talks to inotify directly (see _InotifyObserver)
+INOTIFY_AVAILABLE = False
+if sys.platform.startswith('linux'):
+    try:
+        _libc = ctypes.CDLL(None, use_errno=True)
+        _libc.inotify_init1.argtypes = [ctypes.c_int]
+        _libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        INOTIFY_AVAILABLE = True
+    except (OSError, AttributeError):
+        pass
+_IN_ATTRIB = 0x00000004
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_NONBLOCK = os.O_NONBLOCK
+_IN_CLOEXEC = 0o2000000
 
 # Try to import watchdog, but don't fail if it's not available
 try:
     from watchdog.observers import Observer
-    from watchdog.events import FileSystemEventHandler
+    from watchdog.events import PatternMatchingEventHandler
     WATCHDOG_AVAILABLE = True
 except ImportError:
     WATCHDOG_AVAILABLE = False
-    print("[WARNING] Watchdog not available. Install with: pip install watchdog")
+    if not INOTIFY_AVAILABLE:
+        print("[WARNING] Watchdog not available. Install with: pip install watchdog")
+
+WATCHER_AVAILABLE = INOTIFY_AVAILABLE or WATCHDOG_AVAILABLE
+
+# Prefer orjson for detection JSON (faster, and serializes numpy scalars), fall back to json
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# Numba is optional: when present, box outlines are drawn by a compiled kernel.
+# Only check for it here; it (and numpy) is imported on the first regeneration.
+NUMBA_AVAILABLE = importlib.util.find_spec("numba") is not None
+
+# flock is POSIX-only; JSON reads go unlocked on Windows
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
 
 # Get the base directory
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
+# Input/output folders, resolved once. Output folders are created here instead of on every save.
+TEST_DIR = Path(BASE_DIR) / "test_image"
+JSON_DIR = Path(BASE_DIR) / "output_image" / "json"
+LABELED_DIR = Path(BASE_DIR) / "output_image" / "labeled"
+JSON_DIR.mkdir(parents=True, exist_ok=True)
+LABELED_DIR.mkdir(parents=True, exist_ok=True)
+
+# Drawing style for regenerated images (colours are BGR)
+LABEL_FONT = 0  # cv2.FONT_HERSHEY_SIMPLEX
+LABEL_SCALE = 0.6
+LABEL_THICKNESS = 2
+BOX_COLOR = (0, 0, 255)
+TEXT_COLOR = (0, 255, 255)
+
+# Images above this many pixels are drawn via cv2.UMat when OpenCL is enabled
+UMAT_MIN_PIXELS = 4_000_000
+
+# Detection JSON above this size is memory-mapped for parsing instead of read into a copy
+JSON_MMAP_THRESHOLD = 64 * 1024
+
+# Common image extensions (matched case-insensitively)
+IMAGE_EXTENSIONS = frozenset({'.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.tif'})
+
 
 def process_local_test_image(image_filename=None, save_json=True, auto_watch=True):
     """
@@ -46,7 +117,7 @@ def process_local_test_image(image_filename=None, save_json=True, auto_watch=Tru
         image_filename = "test.jpg"
     
     # Define paths
-    test_image_path = os.path.join(BASE_DIR, "test_image", image_filename)
+    test_image_path = str(TEST_DIR / image_filename)
     
     # Check if the test image exists
     if not os.path.exists(test_image_path):
@@ -55,6 +126,7 @@ def process_local_test_image(image_filename=None, save_json=True, auto_watch=Tru
     print(f"[INFO] Processing local test image: {test_image_path}")
     
     # Run the complete pipeline
+    from inference_core import run_pipeline_for_image
     result = run_pipeline_for_image(test_image_path)
     
     # Save JSON if requested
@@ -68,7 +140,7 @@ def process_local_test_image(image_filename=None, save_json=True, auto_watch=Tru
     print(f"[INFO] Boxes detected: {len(result['boxes'])}")
     
     # Auto-start watcher if requested and JSON was saved
-    if auto_watch and save_json and WATCHDOG_AVAILABLE:
+    if auto_watch and save_json and WATCHER_AVAILABLE:
         if not global_observer:
             print(f"[INFO] Starting automatic JSON file watcher...")
             watcher_started = start_json_watcher()
@@ -78,7 +150,7 @@ def process_local_test_image(image_filename=None, save_json=True, auto_watch=Tru
                 print(f"[WARNING] Failed to start file watcher.")
         else:
             print(f"[INFO] 👁️  File watcher already running.")
-    elif auto_watch and save_json and not WATCHDOG_AVAILABLE:
+    elif auto_watch and save_json and not WATCHER_AVAILABLE:
         print(f"[WARNING] Auto-watch requested but watchdog not available.")
         print(f"[WARNING] Install with: pip install watchdog")
     
@@ -92,23 +164,40 @@ def list_test_images():
     Returns:
         list: List of image filenames in the test_image folder
     """
-    test_image_dir = os.path.join(BASE_DIR, "test_image")
-    
-    if not os.path.exists(test_image_dir):
-        print(f"[WARNING] Test image directory not found: {test_image_dir}")
+    if not TEST_DIR.exists():
+        print(f"[WARNING] Test image directory not found: {TEST_DIR}")
         return []
     
-    # Common image extensions
-    image_extensions = ['.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.tif']
-    
-    image_files = []
-    for file in os.listdir(test_image_dir):
-        if any(file.lower().endswith(ext) for ext in image_extensions):
-            image_files.append(file)
+    # scandir's dirent type lets is_file() skip a stat for regular files
+    with os.scandir(TEST_DIR) as entries:
+        image_files = [entry.name for entry in entries
+                       if os.path.splitext(entry.name)[1].lower() in IMAGE_EXTENSIONS
+                       and entry.is_file()]
     
     return sorted(image_files)
 
 
+# format -> (unix second, formatted time) of its last cached_strftime() call
+_strftime_cache = {}
+
+
+def cached_strftime(fmt):
+    """
+    Format the local time with time.strftime, at most once per second per format.
+    
+    Args:
+        fmt (str): time.strftime format string
+    
+    Returns:
+        str: The current local time in that format
+    """
+    now = int(time.time())
+    cached = _strftime_cache.get(fmt)
+    if cached is None or cached[0] != now:
+        cached = _strftime_cache[fmt] = (now, time.strftime(fmt, time.localtime(now)))
+    return cached[1]
+
+
 def save_detection_json(image_filename, result):
     """
     Save detection results to a JSON file.
@@ -120,20 +209,16 @@ def save_detection_json(image_filename, result):
     Returns:
         str: Path to the saved JSON file
     """
-    # Create JSON output directory
-    json_dir = os.path.join(BASE_DIR, "output_image", "json")
-    os.makedirs(json_dir, exist_ok=True)
-    
     # Generate JSON filename
     base_name = os.path.splitext(image_filename)[0]
     json_filename = f"{base_name}_detections.json"
-    json_path = os.path.join(json_dir, json_filename)
+    json_path = str(JSON_DIR / json_filename)
     
     # Prepare JSON data
     json_data = {
         "image_filename": image_filename,
-        "image_path": os.path.join(BASE_DIR, "test_image", image_filename),
-        "processing_timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "image_path": str(TEST_DIR / image_filename),
+        "processing_timestamp": cached_strftime("%Y-%m-%d %H:%M:%S"),
         "classification": result['label'],
         "total_detections": len(result['boxes']),
         "output_files": {
@@ -144,32 +229,80 @@ def save_detection_json(image_filename, result):
         "detections": []
     }
     
-    # Add detection details
-    for i, box_info in enumerate(result['boxes']):
+    import numpy as np
+    
+    # Box geometry as one (N, 4) x/y/w/h array, so all centers are computed in a single step
+    boxes = np.asarray([box_info['box'] for box_info in result['boxes']], dtype=np.int32).reshape(-1, 4)
+    centers = boxes[:, :2] + boxes[:, 2:] // 2
+    
+    # Add detection details (tolist() converts back to plain ints once for serialization)
+    for i, (box_info, (x, y, w, h), (center_x, center_y)) in enumerate(
+            zip(result['boxes'], boxes.tolist(), centers.tolist())):
         detection = {
             "id": i + 1,
             "type": box_info['type'],
             "confidence": box_info['confidence'],
             "bbox": {
-                "x": box_info['box'][0],
-                "y": box_info['box'][1], 
-                "width": box_info['box'][2],
-                "height": box_info['box'][3]
+                "x": x,
+                "y": y, 
+                "width": w,
+                "height": h
             },
             "center": {
-                "x": box_info['box'][0] + box_info['box'][2] // 2,
-                "y": box_info['box'][1] + box_info['box'][3] // 2
+                "x": center_x,
+                "y": center_y
             }
         }
         json_data["detections"].append(detection)
     
-    # Save JSON file
-    with open(json_path, 'w', encoding='utf-8') as f:
-        json.dump(json_data, f, indent=2, ensure_ascii=False)
+    # Save JSON file (serialize once, then write the whole buffer in one call)
+    if ORJSON_AVAILABLE:
+        buf = orjson.dumps(json_data, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY)
+    else:
+        buf = json.dumps(json_data, indent=2, ensure_ascii=False).encode('utf-8')
+    with open(json_path, 'wb') as f:
+        f.write(buf)
     
     return json_path
 
 
+def _read_detection_json(json_path, hashed=False, known_digest=None):
+    """
+    Read and parse a detection JSON file under a shared lock.
+    
+    Args:
+        json_path (str): Path to the JSON file
+        hashed (bool): Also return an 8-byte blake2b digest of the raw file bytes
+        known_digest (bytes, optional): Digest from an earlier read. If the file
+                                        still matches it, parsing is skipped.
+    
+    Returns:
+        tuple: (data, digest) - data is None if the content matched known_digest,
+               digest is None unless hashed is set
+    """
+    def parse(buf):
+        digest = hashlib.blake2b(buf, digest_size=8).digest() if hashed else None
+        if digest is not None and digest == known_digest:
+            return None, digest
+        return (orjson.loads(buf) if ORJSON_AVAILABLE else json.loads(buf)), digest
+    
+    # Raw fd calls: a buffered open() adds ioctl/lseek calls and f.read() an extra read to hit EOF
+    fd = os.open(json_path, os.O_RDONLY)
+    try:
+        # Shared lock: wait out any in-place edit holding the exclusive lock
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_SH)
+        size = os.fstat(fd).st_size
+        if ORJSON_AVAILABLE and size > JSON_MMAP_THRESHOLD:
+            # Large files: orjson parses straight from the mapped pages, no bytes copy
+            with mmap.mmap(fd, size, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+                return parse(view)
+        raw = os.read(fd, size)
+    finally:
+        os.close(fd)
+    return parse(raw)
+
+
 def load_detection_json(json_path):
     """
     Load detection results from a JSON file.
@@ -181,103 +314,458 @@ def load_detection_json(json_path):
         dict: Detection data from JSON
     """
     try:
-        with open(json_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        return _read_detection_json(json_path)[0]
     except Exception as e:
         raise ValueError(f"Error loading JSON file: {str(e)}")
 
 
-def regenerate_image_from_json(json_path):
+@lru_cache(maxsize=8)
+def _load_original(image_path, mtime_ns):
+    """
+    Decode an original image, cached by (path, mtime) across regenerations.
+    
+    The mtime is part of the key so a replaced image is decoded again.
+    Callers must copy the result before drawing on it.
+    """
+    import cv2
+    return cv2.imread(image_path)
+
+
+@lru_cache(maxsize=256)
+def _label_size(text):
+    """
+    Measure a detection label in the label style, cached by text.
+    
+    Labels repeat across boxes and edits ("hotspot (0.91)"), so most lookups hit the cache.
+    """
+    import cv2
+    return cv2.getTextSize(text, LABEL_FONT, LABEL_SCALE, LABEL_THICKNESS)
+
+
+@lru_cache(maxsize=256)
+def _label_mask(text):
+    """
+    Rasterize a detection label once into a boolean mask, cached by text.
+    
+    putText is pixel-exact under integer translation, so stamping the mask
+    gives the same pixels as calling putText at the target position, as long
+    as the whole mask lies inside the image. Where the image edge clips the
+    label, putText renders differently, so callers must use putText there.
+    
+    Returns:
+        tuple: (mask, origin_x, origin_y) - the (h, w) bool mask and the putText
+               origin (left end of the baseline) inside it. mask is None when
+               putText anti-aliases (OpenCV 5), since a bool mask can't hold that.
+    """
+    import cv2
+    import numpy as np
+    
+    (text_width, text_height), baseline = _label_size(text)
+    # Generous margin (glyphs such as brackets overshoot the measured box), cropped below
+    pad = text_height + LABEL_THICKNESS
+    canvas = np.zeros((text_height + baseline + 2 * pad, text_width + 2 * pad), dtype=np.uint8)
+    cv2.putText(canvas, text, (pad, pad + text_height), LABEL_FONT, LABEL_SCALE, 255, LABEL_THICKNESS)
+    
+    # Only a hard-edged 0/255 rasterization fits in a bool mask
+    if np.count_nonzero(canvas) != np.count_nonzero(canvas == 255):
+        return None, 0, 0
+    
+    rows, cols = np.nonzero(canvas)
+    if len(rows) == 0:
+        return np.zeros((0, 0), dtype=bool), 0, 0
+    top, left = rows.min(), cols.min()
+    mask = canvas[top:rows.max() + 1, left:cols.max() + 1].astype(bool)
+    return mask, int(pad - left), int(pad + text_height - top)
+
+
+def _stamp_mask(img, mask, left, top, color):
+    """
+    Paint color into img wherever mask is set, with mask's top-left at (left, top).
+    
+    Returns:
+        bool: False (nothing painted) if the mask does not fit inside img
+    """
+    height, width = mask.shape
+    if left < 0 or top < 0 or left + width > img.shape[1] or top + height > img.shape[0]:
+        return False
+    img[top:top + height, left:left + width][mask] = color
+    return True
+
+
+@lru_cache(maxsize=1)
+def _box_outline_kernel():
+    """
+    Build the Numba outline kernel on first use (compiled once, then loaded from Numba's disk cache).
+    
+    Returns:
+        function: _draw_box_outlines(img, boxes, color)
+    """
+    # Module global, not a local: a kernel closing over a local can't use Numba's disk cache
+    global numba
+    import numba
+    
+    @numba.njit(parallel=True, cache=True)
+    def _draw_box_outlines(img, boxes, color):
+        """
+        Draw the outlines of an (N, 4) x/y/w/h int32 box array straight into img.
+        
+        Same pixels as cv2.polylines(img, corners, True, color, 2): each edge is a
+        3-px band centred on the line from corner to corner, and the outer corner
+        pixels stay unset (cv2's round joins). Clipped to the image.
+        """
+        height, width = img.shape[0], img.shape[1]
+        for i in numba.prange(boxes.shape[0]):
+            x0 = min(boxes[i, 0], boxes[i, 0] + boxes[i, 2])
+            x1 = max(boxes[i, 0], boxes[i, 0] + boxes[i, 2])
+            y0 = min(boxes[i, 1], boxes[i, 1] + boxes[i, 3])
+            y1 = max(boxes[i, 1], boxes[i, 1] + boxes[i, 3])
+            for yy in range(max(y0 - 1, 0), min(y1 + 2, height)):
+                if yy <= y0 + 1 or yy >= y1 - 1:
+                    # Top/bottom band: the row between the corners
+                    for xx in range(max(x0, 0), min(x1 + 1, width)):
+                        img[yy, xx, 0] = color[0]
+                        img[yy, xx, 1] = color[1]
+                        img[yy, xx, 2] = color[2]
+                if y0 <= yy <= y1:
+                    # Side bands: three pixels around each vertical edge
+                    for xx in (x0 - 1, x0, x0 + 1, x1 - 1, x1, x1 + 1):
+                        if 0 <= xx < width:
+                            img[yy, xx, 0] = color[0]
+                            img[yy, xx, 1] = color[1]
+                            img[yy, xx, 2] = color[2]
+    
+    return _draw_box_outlines
+
+
+def _box_corners(boxes):
+    """
+    Convert (N, 4) x/y/w/h boxes to N closed 4-point polygons for cv2.polylines.
+    
+    cv2.rectangle draws the same closed 4-point polyline internally.
+    """
+    import numpy as np
+    
+    top_left = boxes[:, :2]
+    bottom_right = top_left + boxes[:, 2:]
+    corners = np.stack([top_left,
+                        np.stack([bottom_right[:, 0], top_left[:, 1]], axis=1),
+                        bottom_right,
+                        np.stack([top_left[:, 0], bottom_right[:, 1]], axis=1)], axis=1)
+    return list(corners)
+
+
+def _draw_detections_umat(umat, boxes, labels):
+    """
+    Draw box outlines and labels into an OpenCL cv2.UMat using cv2 primitives only.
+    
+    Same output layout as _draw_detections; the Numba kernel and mask stamping
+    need host memory, so outlines and labels use cv2.rectangle/putText here.
+    """
+    import cv2
+    
+    box_list = boxes.tolist()
+    # One rectangle per box: polylines rejects a point list when drawing into a UMat.
+    # Same pixels as the host path's thick polyline.
+    for x, y, w, h in box_list:
+        cv2.rectangle(umat, (x, y), (x + w, y + h), BOX_COLOR, 2)
+    for text, (x, y, w, h) in zip(labels, box_list):
+        (text_width, text_height), baseline = _label_size(text)
+        cv2.rectangle(umat, (x, max(0, y - text_height - 10)), 
+                     (x + text_width, y), BOX_COLOR, -1)
+        cv2.putText(umat, text, (x, max(text_height, y - 10)), 
+                   LABEL_FONT, LABEL_SCALE, TEXT_COLOR, LABEL_THICKNESS)
+
+
+def _draw_detections(img, boxes, labels):
+    """
+    Draw box outlines and their labels into img.
+    
+    Kept free of JSON/dict access so the per-box work only sees arrays and strings.
+    
+    Args:
+        img (np.ndarray): BGR image, drawn on in place
+        boxes (np.ndarray): (N, 4) int32 array of x/y/w/h boxes
+        labels (list): N label strings, one per box
+    """
+    import cv2
+    import numpy as np
+    
+    # Draw all box outlines in one call
+    if NUMBA_AVAILABLE:
+        _box_outline_kernel()(img, boxes, np.asarray(BOX_COLOR, dtype=np.uint8))
+    elif len(boxes):
+        cv2.polylines(img, _box_corners(boxes), True, BOX_COLOR, 2)
+    
+    # Draw labels on top of the outlines.
+    # Bind the calls and style to locals so each box skips the global/attribute lookups.
+    label_size, label_mask, rectangle, stamp, put_text = _label_size, _label_mask, cv2.rectangle, _stamp_mask, cv2.putText
+    box_color, text_color = BOX_COLOR, TEXT_COLOR
+    for text, (x, y, w, h) in zip(labels, boxes.tolist()):
+        # Draw text background
+        (text_width, text_height), baseline = label_size(text)
+        rectangle(img, (x, max(0, y - text_height - 10)), 
+                  (x + text_width, y), box_color, -1)
+        
+        # Draw text (stamped from its cached rasterization instead of re-rendering the strokes).
+        # Labels clipped by the image edge, or anti-aliased ones, are rendered by putText,
+        # which the mask can't reproduce.
+        mask, origin_x, origin_y = label_mask(text)
+        text_y = max(text_height, y - 10)
+        if mask is None or not stamp(img, mask, x - origin_x, text_y - origin_y, text_color):
+            put_text(img, text, (x, text_y), LABEL_FONT, LABEL_SCALE, text_color, LABEL_THICKNESS)
+
+
+def regenerate_image_from_json(json_path, json_data=None):
     """
     Regenerate labeled image based on JSON detection data.
     
     Args:
         json_path (str): Path to the JSON file containing detection data
+        json_data (dict, optional): Already-parsed contents of json_path.
+                                    If None, the file is loaded from disk.
     
     Returns:
         str: Path to the regenerated labeled image
     """
+    import cv2
+    import numpy as np
+    
     print(f"[REGEN] Starting regeneration from: {json_path}")
     
     # Load JSON data
-    print(f"[REGEN] Loading JSON data...")
-    json_data = load_detection_json(json_path)
-    print(f"[REGEN] JSON loaded successfully. Found {len(json_data.get('detections', []))} detection(s)")
+    if json_data is None:
+        print(f"[REGEN] Loading JSON data...")
+        json_data = load_detection_json(json_path)
+        print(f"[REGEN] JSON loaded successfully. Found {len(json_data.get('detections', []))} detection(s)")
     
     # Load original image
     original_image_path = json_data['image_path']
     print(f"[REGEN] Original image path: {original_image_path}")
     
-    if not os.path.exists(original_image_path):
+    # One stat both checks the image exists and gives the mtime for the decode cache
+    try:
+        mtime_ns = os.stat(original_image_path).st_mtime_ns
+    except FileNotFoundError:
         raise FileNotFoundError(f"Original image not found: {original_image_path}")
     
-    # Load image
+    # Load image (decoded once per file version, then copied so drawing doesn't touch the cache)
     print(f"[REGEN] Loading original image...")
-    img = cv2.imread(original_image_path)
+    img = _load_original(original_image_path, mtime_ns)
     if img is None:
         raise ValueError(f"Could not load image: {original_image_path}")
+    img = img.copy()
     
     print(f"[REGEN] Image loaded. Shape: {img.shape}")
     print(f"[REGEN] Regenerating image from JSON: {json_path}")
     print(f"[REGEN] Found {len(json_data['detections'])} detection(s) in JSON")
     
-    # Draw boxes based on JSON data
-    for i, detection in enumerate(json_data['detections']):
-        bbox = detection['bbox']
-        x, y, w, h = bbox['x'], bbox['y'], bbox['width'], bbox['height']
+    detections = json_data['detections']
+    
+    # Unpack the JSON into plain arrays/strings, then draw everything in one pass
+    boxes = np.asarray([[d['bbox']['x'], d['bbox']['y'], d['bbox']['width'], d['bbox']['height']]
+                        for d in detections], dtype=np.int32).reshape(-1, 4)
+    labels = []
+    for i, (detection, (x, y, w, h)) in enumerate(zip(detections, boxes.tolist())):
         print(f"[REGEN] Drawing detection {i+1}: {detection['type']} at ({x}, {y}, {w}, {h})")
-        
-        # Draw rectangle
-        cv2.rectangle(img, (x, y), (x + w, y + h), (0, 0, 255), 2)
-        
-        # Prepare text
-        text = f"{detection['type']} ({detection['confidence']:.2f})"
-        
-        # Draw text background
-        (text_width, text_height), baseline = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 2)
-        cv2.rectangle(img, (x, max(0, y - text_height - 10)), 
-                     (x + text_width, y), (0, 0, 255), -1)
-        
-        # Draw text
-        cv2.putText(img, text, (x, max(text_height, y - 10)), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 255), 2)
+        labels.append(f"{detection['type']} ({detection['confidence']:.2f})")
+    
+    # Very large images are drawn on the OpenCL device when OpenCV has it enabled;
+    # below the size gate the upload/download costs more than the drawing.
+    if img.shape[0] * img.shape[1] > UMAT_MIN_PIXELS and cv2.ocl.useOpenCL():
+        print(f"[REGEN] Drawing on OpenCL device")
+        umat = cv2.UMat(img)
+        _draw_detections_umat(umat, boxes, labels)
+        img = umat.get()
+    else:
+        _draw_detections(img, boxes, labels)
     
     # If no detections, add classification label
     if len(json_data['detections']) == 0:
         print(f"[REGEN] No detections found, adding classification label: {json_data['classification']}")
         cv2.putText(img, json_data['classification'], (10, 30), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 255), 2)
+                   LABEL_FONT, 1, TEXT_COLOR, LABEL_THICKNESS)
     
     # Generate output path
     image_filename = json_data['image_filename']
     base_name = os.path.splitext(image_filename)[0]
-    output_path = os.path.join(BASE_DIR, "output_image", "labeled", f"{base_name}_boxed.png")
+    output_path = str(LABELED_DIR / f"{base_name}_boxed.png")
     
     print(f"[REGEN] Output path: {output_path}")
     
-    # Ensure output directory exists
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    
-    # Save regenerated image
+    # Save regenerated image. zlib level 1 keeps the PNG encode cheap on every edit;
+    # encoding in memory and renaming into place means viewers never read a partial file.
     print(f"[REGEN] Saving regenerated image...")
-    success = cv2.imwrite(output_path, img)
+    success, encoded = cv2.imencode('.png', img, [int(cv2.IMWRITE_PNG_COMPRESSION), 1])
     if not success:
         raise ValueError(f"Failed to save regenerated image: {output_path}")
+    tmp_path = f"{output_path}.tmp.{os.getpid()}"
+    encoded.tofile(tmp_path)
+    os.replace(tmp_path, output_path)
     
     print(f"[REGEN] ✅ Regenerated labeled image saved: {output_path}")
     return output_path
 
 
+class _JSONDebouncer:
+    """
+    Coalesce change events per JSON file and regenerate images on one worker thread.
+    
+    Each event (re)arms a per-file deadline; the worker sleeps until the nearest
+    deadline and processes every file that is due in one pass.
+    """
+    
+    def __init__(self, delay=0.5):
+        self.debounce_delay = delay
+        self.pending = {}  # json path -> monotonic deadline
+        self.cv = threading.Condition()
+        self.stopped = False
+        self.last_digest = {}  # json path -> content digest of the last regenerated version
+        self.worker = threading.Thread(target=self._worker_loop, name="json-watcher", daemon=True)
+        self.worker.start()
+    
+    def schedule(self, file_path):
+        """(Re)arm the debounce deadline for file_path and wake the worker."""
+        with self.cv:
+            rescheduled = file_path in self.pending
+            self.pending[file_path] = time.monotonic() + self.debounce_delay
+            self.cv.notify()
+        if rescheduled:
+            print(f"[WATCHER] Pushed back pending update for: {os.path.basename(file_path)}")
+        print(f"[WATCHER] Scheduled update in {self.debounce_delay}s for: {os.path.basename(file_path)}")
+    
+    def _worker_loop(self):
+        """Sleep until the nearest deadline, then process every path that is due."""
+        while True:
+            with self.cv:
+                while not self.stopped:
+                    now = time.monotonic()
+                    ready = [path for path, deadline in self.pending.items() if deadline <= now]
+                    if ready:
+                        break
+                    timeout = min(self.pending.values()) - now if self.pending else None
+                    self.cv.wait(timeout)
+                if self.stopped:
+                    return
+                for path in ready:
+                    del self.pending[path]
+            
+            # Read every due file before drawing any of them, so the reads go out back to back
+            batch = []
+            for path in ready:
+                try:
+                    json_data, digest = _read_detection_json(path, hashed=True,
+                                                             known_digest=self.last_digest.get(path))
+                except Exception as e:
+                    print(f"[WATCHER] ❌ Error processing JSON change: Error loading JSON file: {str(e)}")
+                    continue
+                # Editors often save identical content twice; only real changes are redrawn
+                if json_data is None:
+                    print(f"[WATCHER] Content unchanged, skipping: {os.path.basename(path)}")
+                    continue
+                batch.append((path, json_data, digest))
+            for path, json_data, digest in batch:
+                if self._process_json_change(path, json_data):
+                    self.last_digest[path] = digest
+    
+    def close(self):
+        """Drop pending updates and stop the worker thread."""
+        with self.cv:
+            self.stopped = True
+            self.pending.clear()
+            self.cv.notify()
+        self.worker.join()
+    
+    def _process_json_change(self, json_path, json_data=None):
+        """Process the JSON file change after debounce delay. Returns True on success."""
+        try:
+            print(f"[WATCHER] 🔄 Processing changes in: {os.path.basename(json_path)}")
+            print(f"[WATCHER] Calling regenerate_image_from_json...")
+            output_path = regenerate_image_from_json(json_path, json_data=json_data)
+            print(f"[WATCHER] ✅ Image updated successfully: {os.path.basename(output_path)}")
+            print(f"[WATCHER] Updated image path: {output_path}")
+            return True
+        except Exception as e:
+            print(f"[WATCHER] ❌ Error processing JSON change: {str(e)}")
+            print(f"[WATCHER] Full error traceback:")
+            traceback.print_exception(type(e), e, e.__traceback__, file=sys.stderr)
+            return False
+
+
+if INOTIFY_AVAILABLE:
+    class _InotifyObserver(threading.Thread):
+        """
+        Watch one directory with raw inotify, exposing the Observer start/stop/join interface.
+        
+        Only IN_CLOSE_WRITE (a write finished), IN_MOVED_TO (a rename onto a file,
+        i.e. an atomic save) and IN_ATTRIB (e.g. a touch) are requested, so a save
+        arrives as a single event. Touches are cheap: unchanged content is skipped.
+        """
+        
+        def __init__(self, directory, on_change):
+            super().__init__(name="json-inotify", daemon=True)
+            self.directory = directory
+            self.on_change = on_change
+            self.fd = _libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+            if self.fd < 0:
+                err = ctypes.get_errno()
+                raise OSError(err, os.strerror(err))
+            if _libc.inotify_add_watch(self.fd, os.fsencode(directory), _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_ATTRIB) < 0:
+                err = ctypes.get_errno()
+                os.close(self.fd)
+                raise OSError(err, os.strerror(err), directory)
+            # Writing to this pipe wakes the epoll wait so stop() needs no polling
+            self.wake_r, self.wake_w = os.pipe()
+            self.stopping = False
+        
+        def run(self):
+            epoll = select.epoll()
+            try:
+                epoll.register(self.fd, select.EPOLLIN)
+                epoll.register(self.wake_r, select.EPOLLIN)
+                while True:
+                    for fd, _ in epoll.poll():
+                        if fd == self.wake_r:
+                            return
+                        self._read_events()
+            finally:
+                epoll.close()
+                os.close(self.fd)
+                os.close(self.wake_r)
+        
+        def _read_events(self):
+            """Drain the inotify fd and report each named event as a full path."""
+            try:
+                buf = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return
+            offset = 0
+            while offset < len(buf):
+                # struct inotify_event: int wd; uint32 mask, cookie, len; char name[len]
+                _, _, _, name_len = struct.unpack_from('iIII', buf, offset)
+                name = buf[offset + 16:offset + 16 + name_len].rstrip(b'\0')
+                offset += 16 + name_len
+                if name:
+                    self.on_change(os.path.join(self.directory, os.fsdecode(name)))
+        
+        def stop(self):
+            if not self.stopping:
+                self.stopping = True
+                os.write(self.wake_w, b'\0')
+                os.close(self.wake_w)
+
+
 def start_json_watcher():
     """
     Start watching JSON files for changes and auto-regenerate images.
     
+    Uses native inotify on Linux and falls back to watchdog elsewhere.
+    
     Returns:
-        Observer: The file system observer (for stopping later)
+        bool: True if the watcher was started
     """
-    global global_observer
+    global global_observer, global_debouncer
     
-    if not WATCHDOG_AVAILABLE:
+    if not WATCHER_AVAILABLE:
         print(f"[WATCHER] ❌ Watchdog not available. Install with: pip install watchdog")
         return False
     
@@ -285,20 +773,25 @@ def start_json_watcher():
     if global_observer:
         stop_json_watcher()
     
-    json_dir = os.path.join(BASE_DIR, "output_image", "json")
-    
-    if not os.path.exists(json_dir):
-        print(f"[WATCHER] Creating JSON directory: {json_dir}")
-        os.makedirs(json_dir, exist_ok=True)
+    json_dir = str(JSON_DIR)
     
     try:
-        # Create handler that inherits from FileSystemEventHandler
-        if WATCHDOG_AVAILABLE:
-            class JSONHandler(FileSystemEventHandler):
-                def __init__(self):
-                    super().__init__()
-                    self.debounce_timers = {}
-                    self.debounce_delay = 0.5  # Reduced from 1.0 to 0.5 seconds for faster response
+        global_debouncer = _JSONDebouncer(delay=0.5)  # Reduced from 1.0 to 0.5 seconds for faster response
+        
+        if INOTIFY_AVAILABLE:
+            def on_saved(file_path):
+                if not file_path.endswith('_detections.json'):
+                    return
+                print(f"[WATCHER] 🔄 JSON detection file saved: {os.path.basename(file_path)}")
+                global_debouncer.schedule(file_path)
+            
+            global_observer = _InotifyObserver(json_dir, on_saved)
+        else:
+            # watchdog drops directories and non-detection files (editor swap/temp files) before dispatch
+            class JSONHandler(PatternMatchingEventHandler):
+                def __init__(self, debouncer):
+                    super().__init__(patterns=['*_detections.json'], ignore_directories=True)
+                    self.debouncer = debouncer
                 
                 def on_modified(self, event):
                     self._handle_file_event(event, "modified")
@@ -310,54 +803,18 @@ def start_json_watcher():
                     self._handle_file_event(event, "created")
                 
                 def _handle_file_event(self, event, event_type):
-                    if event.is_directory:
-                        return
-                    
-                    file_path = event.src_path
-                    print(f"[WATCHER] File {event_type}: {os.path.basename(file_path)}")
-                    
-                    if not file_path.endswith('_detections.json'):
-                        print(f"[WATCHER] Ignoring non-detection file: {os.path.basename(file_path)}")
+                    # Atomic saves (write temp file, then rename) show up as a move onto the JSON
+                    file_path = event.dest_path if event_type == "moved" else event.src_path
+                    if event_type == "moved" and not file_path.endswith('_detections.json'):
+                        # Matched on the source name only: a detection file was renamed away
                         return
                     
                     print(f"[WATCHER] 🔄 JSON detection file {event_type}: {os.path.basename(file_path)}")
-                    
-                    # Cancel existing timer for this file
-                    if file_path in self.debounce_timers:
-                        self.debounce_timers[file_path].cancel()
-                        print(f"[WATCHER] Cancelled previous timer for: {os.path.basename(file_path)}")
-                    
-                    # Set new timer with debounce
-                    timer = Timer(self.debounce_delay, self._process_json_change, [file_path])
-                    self.debounce_timers[file_path] = timer
-                    timer.start()
-                    print(f"[WATCHER] Started {self.debounce_delay}s debounce timer for: {os.path.basename(file_path)}")
-                
-                def _process_json_change(self, json_path):
-                    """Process the JSON file change after debounce delay."""
-                    try:
-                        print(f"[WATCHER] 🔄 Processing changes in: {os.path.basename(json_path)}")
-                        print(f"[WATCHER] Calling regenerate_image_from_json...")
-                        output_path = regenerate_image_from_json(json_path)
-                        print(f"[WATCHER] ✅ Image updated successfully: {os.path.basename(output_path)}")
-                        print(f"[WATCHER] Updated image path: {output_path}")
-                    except Exception as e:
-                        print(f"[WATCHER] ❌ Error processing JSON change: {str(e)}")
-                        import traceback
-                        print(f"[WATCHER] Full error traceback:")
-                        traceback.print_exc()
-                    finally:
-                        # Clean up timer
-                        if json_path in self.debounce_timers:
-                            del self.debounce_timers[json_path]
-                            print(f"[WATCHER] Cleaned up timer for: {os.path.basename(json_path)}")
+                    self.debouncer.schedule(file_path)
             
-            event_handler = JSONHandler()
-        else:
-            return False
+            global_observer = Observer()
+            global_observer.schedule(JSONHandler(global_debouncer), json_dir, recursive=False)
         
-        global_observer = Observer()
-        global_observer.schedule(event_handler, json_dir, recursive=False)
         global_observer.start()
         
         print(f"[WATCHER] 👁️  Started watching JSON files in: {json_dir}")
@@ -366,7 +823,10 @@ def start_json_watcher():
         
     except Exception as e:
         print(f"[WATCHER] ❌ Failed to start file watcher: {str(e)}")
+        if global_debouncer:
+            global_debouncer.close()
         global_observer = None
+        global_debouncer = None
         return False
 
 
@@ -377,7 +837,7 @@ def stop_json_watcher(observer=None):
     Args:
         observer: The Observer instance to stop (optional, uses global if not provided)
     """
-    global global_observer
+    global global_observer, global_debouncer
     
     target_observer = observer or global_observer
     
@@ -385,12 +845,15 @@ def stop_json_watcher(observer=None):
         try:
             target_observer.stop()
             target_observer.join()
+            if target_observer == global_observer and global_debouncer:
+                global_debouncer.close()
             print(f"[WATCHER] 🛑 Stopped watching JSON files")
         except Exception as e:
             print(f"[WATCHER] Error stopping watcher: {str(e)}")
         finally:
             if target_observer == global_observer:
                 global_observer = None
+                global_debouncer = None
 
 
 def cleanup_watcher():
@@ -401,9 +864,28 @@ def cleanup_watcher():
 # Register cleanup function
 atexit.register(cleanup_watcher)
 
+# Set on Ctrl+C while main() is blocked in wait_for_shutdown()
+_shutdown = threading.Event()
+_waiting_for_shutdown = False
+
+
+def wait_for_shutdown():
+    """Block the main thread until Ctrl+C without waking up in between."""
+    global _waiting_for_shutdown
+    _waiting_for_shutdown = True
+    try:
+        _shutdown.wait()
+    finally:
+        _waiting_for_shutdown = False
+
+
 # Handle Ctrl+C gracefully
 def signal_handler(sig, frame):
     print(f"\n[INFO] Received interrupt signal. Cleaning up...")
+    if _waiting_for_shutdown:
+        # main() wakes up and stops the watcher itself
+        _shutdown.set()
+        return
     cleanup_watcher()
     exit(0)
 
@@ -428,28 +910,44 @@ def process_all_test_images(save_json=True, auto_watch=True):
         return {}
     
     results = {}
+    pending_saves = {}  # image name -> Future for its JSON path
     print(f"\nProcessing {len(test_images)} test image(s)...")
     
-    for i, image_name in enumerate(test_images, 1):
-        print(f"\n[{i}/{len(test_images)}] Processing: {image_name}")
+    # JSON saves run on a background thread so the next image's inference starts right away
+    with ThreadPoolExecutor(max_workers=1) as save_executor:
+        for i, image_name in enumerate(test_images, 1):
+            print(f"\n[{i}/{len(test_images)}] Processing: {image_name}")
+            try:
+                result = process_local_test_image(image_name, save_json=False, auto_watch=False)
+                results[image_name] = result
+                print(f"    ✅ Success: {result['label']}")
+                if save_json:
+                    pending_saves[image_name] = save_executor.submit(save_detection_json, image_name, result)
+            except Exception as e:
+                print(f"    ❌ Error: {str(e)}")
+                results[image_name] = {"error": str(e)}
+    
+    # All saves have finished once the executor exits
+    for image_name, future in pending_saves.items():
         try:
-            # For the first image, start auto_watch. For subsequent images, don't restart watcher
-            should_auto_watch = auto_watch and i == 1
-            result = process_local_test_image(image_name, save_json=save_json, auto_watch=should_auto_watch)
-            results[image_name] = result
-            print(f"    ✅ Success: {result['label']}")
-            if save_json and 'json_path' in result:
-                print(f"    📄 JSON saved: {os.path.basename(result['json_path'])}")
+            results[image_name]['json_path'] = future.result()
+            print(f"    📄 JSON saved: {os.path.basename(results[image_name]['json_path'])}")
         except Exception as e:
-            print(f"    ❌ Error: {str(e)}")
+            print(f"    ❌ Error saving JSON for {image_name}: {str(e)}")
             results[image_name] = {"error": str(e)}
     
+    # Start the watcher once every JSON file is in place, so the saves above don't trigger it
+    if auto_watch and pending_saves and WATCHER_AVAILABLE and not global_observer:
+        print(f"\n[INFO] Starting automatic JSON file watcher...")
+        if not start_json_watcher():
+            print(f"[WARNING] Failed to start file watcher.")
+    
     # Show watcher status after processing all images
     if auto_watch and save_json and len(results) > 0:
-        if WATCHDOG_AVAILABLE and global_observer:
+        if WATCHER_AVAILABLE and global_observer:
             print(f"\n[INFO] 👁️  File watcher is active for all processed images!")
             print(f"[INFO] Edit any JSON file to automatically update the corresponding image.")
-        elif not WATCHDOG_AVAILABLE:
+        elif not WATCHER_AVAILABLE:
             print(f"\n[WARNING] Install watchdog to enable auto-update: pip install watchdog")
     
     return results
@@ -571,13 +1069,13 @@ def main():
                 # Keep the script running to maintain the watcher
                 try:
                     print(f"\n⏳ Watching for JSON file changes... (Press Ctrl+C to stop)")
-                    while True:
-                        time.sleep(1)
+                    wait_for_shutdown()
                 except KeyboardInterrupt:
-                    print(f"\n\n🛑 Stopping file watcher...")
-                    stop_json_watcher()
-                    print(f"File watcher stopped. Exiting.")
-                    return
+                    pass
+                print(f"\n\n🛑 Stopping file watcher...")
+                stop_json_watcher()
+                print(f"File watcher stopped. Exiting.")
+                return
         
         elif choice == "2":
             # Process all images
@@ -594,13 +1092,13 @@ def main():
                 # Keep the script running to maintain the watcher
                 try:
                     print(f"\n⏳ Watching for JSON file changes... (Press Ctrl+C to stop)")
-                    while True:
-                        time.sleep(1)
+                    wait_for_shutdown()
                 except KeyboardInterrupt:
-                    print(f"\n\n🛑 Stopping file watcher...")
-                    stop_json_watcher()
-                    print(f"File watcher stopped. Exiting.")
-                    return
+                    pass
+                print(f"\n\n🛑 Stopping file watcher...")
+                stop_json_watcher()
+                print(f"File watcher stopped. Exiting.")
+                return
         
         elif choice == "3":
             # Choose specific image
@@ -630,13 +1128,13 @@ def main():
                         # Keep the script running to maintain the watcher
                         try:
                             print(f"\n⏳ Watching for JSON file changes... (Press Ctrl+C to stop)")
-                            while True:
-                                time.sleep(1)
+                            wait_for_shutdown()
                         except KeyboardInterrupt:
-                            print(f"\n\n🛑 Stopping file watcher...")
-                            stop_json_watcher()
-                            print(f"File watcher stopped. Exiting.")
-                            return
+                            pass
+                        print(f"\n\n🛑 Stopping file watcher...")
+                        stop_json_watcher()
+                        print(f"File watcher stopped. Exiting.")
+                        return
                 else:
                     print("Invalid choice.")
                     return
@@ -646,13 +1144,8 @@ def main():
         
         elif choice == "4":
             # Regenerate from JSON
-            json_dir = os.path.join(BASE_DIR, "output_image", "json")
-            if not os.path.exists(json_dir):
-                print("No JSON files found. Process some images first.")
-                return
-            
             # List available JSON files
-            json_files = [f for f in os.listdir(json_dir) if f.endswith('_detections.json')]
+            json_files = [f for f in os.listdir(JSON_DIR) if f.endswith('_detections.json')]
             if not json_files:
                 print("No detection JSON files found. Process some images first.")
                 return
@@ -665,14 +1158,14 @@ def main():
                 json_choice = int(input(f"\nChoose JSON file (1-{len(json_files)}): ")) - 1
                 if 0 <= json_choice < len(json_files):
                     json_file = json_files[json_choice]
-                    json_path = os.path.join(json_dir, json_file)
+                    json_path = str(JSON_DIR / json_file)
                     
                     print(f"\n2. Regenerating image from: {json_file}")
                     output_path = regenerate_image_from_json(json_path)
                     print(f"✅ Image regenerated: {os.path.basename(output_path)}")
                     
                     # Start watcher if not already running
-                    if not global_observer and WATCHDOG_AVAILABLE:
+                    if not global_observer and WATCHER_AVAILABLE:
                         print(f"[INFO] Starting file watcher for future edits...")
                         start_json_watcher()
                         print(f"💡 File watcher is now active!")
@@ -680,13 +1173,13 @@ def main():
                         # Keep the script running to maintain the watcher
                         try:
                             print(f"\n⏳ Watching for JSON file changes... (Press Ctrl+C to stop)")
-                            while True:
-                                time.sleep(1)
+                            wait_for_shutdown()
                         except KeyboardInterrupt:
-                            print(f"\n\n🛑 Stopping file watcher...")
-                            stop_json_watcher()
-                            print(f"File watcher stopped. Exiting.")
-                            return
+                            pass
+                        print(f"\n\n🛑 Stopping file watcher...")
+                        stop_json_watcher()
+                        print(f"File watcher stopped. Exiting.")
+                        return
                 else:
                     print("Invalid choice.")
                     return
@@ -713,8 +1206,7 @@ def main():
         
     except Exception as e:
         print(f"❌ Error: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        traceback.print_exception(type(e), e, e.__traceback__, file=sys.stderr)
     finally:
         # Don't automatically stop watcher here - let it run for auto-updates
         pass
@@ -4,71 +4,166 @@ This script will continuously show watcher status.
 """
 
 import os
-import time
-import json
+import signal
+import asyncio
+import argparse
+from _test_utils import (
+    DETECTION_SUFFIX, SUFFIX_START, JSON_DIR, LABELED_DIR,
+    _loads, atomic_write_json,  # orjson when available, json otherwise
+)
+from test_local_inference import cached_strftime
 
-def monitor_watcher_status():
-    """Monitor if the watcher is actively responding to changes."""
+# With watchfiles, each test waits for the watcher's response instead of a fixed 5s
+try:
+    from watchfiles import awatch
+    WATCHFILES_AVAILABLE = True
+except ImportError:
+    WATCHFILES_AVAILABLE = False
+
+async def _wait_for_image_update(labeled_path, timeout):
+    """
+    Wait until the watcher rewrites labeled_path, or until timeout seconds pass.
+    
+    Args:
+        labeled_path (Path): Labeled image the watcher regenerates
+        timeout (float): Seconds to wait at most
+    
+    Returns:
+        bool: True if the image was updated, False on timeout,
+              None if watchfiles is unavailable (plain sleep)
+    """
+    if not WATCHFILES_AVAILABLE:
+        await asyncio.sleep(timeout)
+        return None
+    
+    async def first_change():
+        # The regenerator publishes the PNG with an atomic rename onto labeled_path
+        async for _ in awatch(LABELED_DIR, watch_filter=lambda change, path: os.path.basename(path) == labeled_path.name):
+            return
+    
+    try:
+        await asyncio.wait_for(first_change(), timeout)
+        return True
+    except asyncio.TimeoutError:
+        return False
+
+async def _unless_stopped(aw, stop):
+    """
+    Await aw, giving up as soon as stop is set.
+    
+    Args:
+        aw (awaitable): Coroutine to run
+        stop (asyncio.Event): Set when the monitor should end
+    
+    Returns:
+        The result of aw, or None if stop was set first
+    """
+    task = asyncio.ensure_future(aw)
+    stopper = asyncio.ensure_future(stop.wait())
+    await asyncio.wait((task, stopper), return_when=asyncio.FIRST_COMPLETED)
+    for pending in (task, stopper):
+        pending.cancel()
+    return task.result() if task.done() and not task.cancelled() else None
+
+async def monitor_watcher_status(touch=False):
+    """
+    Monitor if the watcher is actively responding to changes.
     
-    json_dir = os.path.join(os.path.dirname(__file__), "output_image", "json")
+    Args:
+        touch (bool): Only bump the JSON's mtime each round instead of rewriting it.
+                      The watcher sees the event but skips redrawing unchanged content.
+    """
     
-    if not os.path.exists(json_dir):
+    if not JSON_DIR.exists():
         print("❌ No JSON directory found.")
         return
     
-    json_files = [f for f in os.listdir(json_dir) if f.endswith('_detections.json')]
+    # Stop at the first detection file instead of listing the whole directory
+    with os.scandir(JSON_DIR) as entries:
+        test_file = next((entry.path for entry in entries if entry.name[SUFFIX_START:] == DETECTION_SUFFIX), None)
     
-    if not json_files:
+    if test_file is None:
         print("❌ No JSON files found. Process some images first.")
         return
     
-    test_file = os.path.join(json_dir, json_files[0])
+    test_name = os.path.basename(test_file)
+    labeled_path = LABELED_DIR / f"{test_name[:SUFFIX_START]}_boxed.png"
     
-    print(f"🧪 Testing watcher with: {json_files[0]}")
+    print(f"🧪 Testing watcher with: {test_name}")
     print(f"💡 If watcher is active, you should see updates when this script modifies the JSON.")
     print(f"🛑 Press Ctrl+C to stop\n")
     
     counter = 0
     
+    # Load JSON once; each iteration only changes the test field in this copy
+    with open(test_file, 'rb') as f:
+        data = _loads(f.read())
+    
+    # Hold the JSON folder open so each save works relative to it instead of resolving the full path
+    dir_fd = None
+    # os.replace takes src_dir_fd/dst_dir_fd, so it is never listed in supports_dir_fd;
+    # it goes through renameat like os.rename, so check that instead
+    if os.open in os.supports_dir_fd and os.rename in os.supports_dir_fd:
+        dir_fd = os.open(JSON_DIR, os.O_RDONLY)
+    save_path = test_name if dir_fd is not None else test_file
+    
+    # Ctrl+C only sets this event; the loop ends at its next check and cleans up below
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    try:
+        loop.add_signal_handler(signal.SIGINT, stop.set)
+    except NotImplementedError:
+        # No loop signal handlers on Windows
+        signal.signal(signal.SIGINT, lambda sig, frame: loop.call_soon_threadsafe(stop.set))
+    
     try:
-        while True:
+        while not stop.is_set():
             counter += 1
             
-            # Load JSON
-            with open(test_file, 'r') as f:
-                data = json.load(f)
+            if touch:
+                # One utimensat call; nothing to read, parse, write or clean up
+                os.utime(test_file, None)
+                print(f"[{cached_strftime('%H:%M:%S')}] Test #{counter}: Touched JSON file")
+                print("   → If watcher is active, you should see '[WATCHER] Content unchanged' messages")
+                await _unless_stopped(asyncio.sleep(5), stop)
+                continue
             
             # Add a test comment to trigger file change
-            data['_test_modification'] = f"Auto-test #{counter} at {time.strftime('%H:%M:%S')}"
+            now = cached_strftime('%H:%M:%S')
+            data['_test_modification'] = f"Auto-test #{counter} at {now}"
             
-            # Save JSON
-            with open(test_file, 'w') as f:
-                json.dump(data, f, indent=2)
+            # Save JSON (temp file + os.replace: the watcher sees one rename, never a partial file).
+            # The test field is removed again on exit, so the save skips the fsync.
+            atomic_write_json(save_path, data, dir_fd=dir_fd, durable=False)
             
-            print(f"[{time.strftime('%H:%M:%S')}] Test #{counter}: Modified JSON file")
+            print(f"[{now}] Test #{counter}: Modified JSON file")
             print("   → If watcher is active, you should see '[WATCHER]' messages")
             
-            # Wait before next test
-            time.sleep(5)
-            
-    except KeyboardInterrupt:
+            # Wait for the watcher to respond (at most 5s) before the next test.
+            # The watcher debounces for 0.5s, so the awatch is in place well before it writes.
+            updated = await _unless_stopped(_wait_for_image_update(labeled_path, 5), stop)
+            if stop.is_set():
+                break
+            if updated:
+                print(f"   ✅ Watcher responded: {labeled_path.name} updated")
+            elif updated is not None:
+                print(f"   ⚠️  No image update within 5s. Is the watcher running?")
+        
         print(f"\n\n🛑 Test stopped.")
         
-        # Clean up test data
-        try:
-            with open(test_file, 'r') as f:
-                data = json.load(f)
-            
-            if '_test_modification' in data:
-                del data['_test_modification']
-                
-                with open(test_file, 'w') as f:
-                    json.dump(data, f, indent=2)
-                
-                print(f"🧹 Cleaned up test data from JSON file.")
-        except Exception as e:
-            print(f"❌ Cleanup error: {e}")
+        # Clean up test data. data is what this script last wrote, so no need to read it back.
+        if data.pop('_test_modification', None) is not None:
+            atomic_write_json(save_path, data, dir_fd=dir_fd)
+            print(f"🧹 Cleaned up test data from JSON file.")
+    finally:
+        if dir_fd is not None:
+            os.close(dir_fd)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Keep modifying a detection JSON to check the watcher stays responsive.")
+    parser.add_argument("--touch", action="store_true",
+                        help="only touch the JSON each round instead of rewriting it")
+    args = parser.parse_args()
+    
     print("=== File Watcher Persistence Test ===")
-    monitor_watcher_status()
\ No newline at end of file
+    asyncio.run(monitor_watcher_status(touch=args.touch))
\ No newline at end of file